@@ -29,14 +29,13 @@ from typing import Optional
 gi.require_version('Gtk', '3.0')  # isort:skip
 from gi.repository import Gtk  # isort:skip
 
-from qubes_config.widgets.gtk_utils import load_icon
 from qubesadmin import exc
 
 from qui.utils import check_support
 from qui.updater.utils import disable_checkboxes, HeaderCheckbox, \
     pass_through_event_window, \
     QubeName, label_color_theme, UpdateStatus, RowWrapper, \
-    ListWrapper, on_head_checkbox_toggled
+    ListWrapper, on_head_checkbox_toggled, load_qube_icon
 
 
 class IntroPage:
@@ -144,7 +143,7 @@ class IntroPage:
             return
 
         self.list_store.invert_selection(path)
-        selected_num = sum(row.selected for row in self.list_store)
+        selected_num = self.list_store.selected_num
         if selected_num == len(self.list_store):
             self.head_checkbox.state = HeaderCheckbox.ALL
         elif selected_num == 0:
@@ -258,7 +257,7 @@ class UpdateRowWrapper(RowWrapper):
         last_updates_check = vm.features.get('last-updates-check', None)
         last_update = vm.features.get('last-update', None)
 
-        icon = load_icon(vm.icon)
+        icon = load_qube_icon(vm.icon)
         name = QubeName(vm.name, str(vm.label))
 
         raw_row = [
@@ -285,7 +284,7 @@ class UpdateRowWrapper(RowWrapper):
 
     @selected.setter
     def selected(self, value):
-        self.raw_row[self._SELECTION] = value
+        self._set_selection(value)
 
     @property
     def icon(self):
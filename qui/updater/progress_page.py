@@ -54,6 +54,8 @@ class ProgressPage:
         self.vms_to_update = None
         self.exit_triggered = False
         self.update_thread = None
+        self._progress_by_name: Dict[str, int] = {}
+        self._progress_sum = 0
 
         self.update_details = QubeUpdateDetails(self.builder)
 
@@ -314,7 +316,9 @@ class ProgressPage:
     def do_update_templates(
             self, rows: Dict[str, RowWrapper], settings: Settings):
         """Runs `qubes-vm-update` command."""
-        targets = ",".join((name for name in rows.keys()))
+        targets = ",".join(rows)
+        self._progress_by_name = {}
+        self._progress_sum = 0
 
         args = []
         if settings.max_concurrency is not None:
@@ -362,35 +366,43 @@ class ProgressPage:
 
     def handle_err_line(self, untrusted_line, rows):
         line = self._sanitize_line(untrusted_line)
-        try:
-            name, status, info = line.split()
-            if status == "updating":
-                progress = int(float(info))
-                GLib.idle_add(rows[name].set_update_progress, progress)
-                total_progress = sum(
-                    row.get_update_progress()
-                    for row in rows.values()) / len(rows)
-                GLib.idle_add(self.set_total_progress, total_progress)
-
-        except ValueError:
+        parts = line.split()
+        if len(parts) != 3:
             return
+        name, status, info = parts
 
-        try:
-            if status == "done":
+        if status == "updating":
+            try:
+                progress = int(float(info))
+            except ValueError:
+                return
+            GLib.idle_add(rows[name].set_update_progress, progress)
+            # keep the running sum instead of rescanning all rows per line
+            self._progress_sum += \
+                progress - self._progress_by_name.get(name, 0)
+            self._progress_by_name[name] = progress
+            GLib.idle_add(
+                self.set_total_progress, self._progress_sum / len(rows))
+        elif status == "done":
+            try:
                 update_status = UpdateStatus.from_name(info)
                 GLib.idle_add(rows[name].set_status, update_status)
-        except KeyError:
-            return
+            except KeyError:
+                return
 
     def read_stdouts(self, proc, rows):
         curr_name_out = ""
         for untrusted_line in iter(proc.stdout.readline, ''):
             if untrusted_line:
                 line = self._sanitize_line(untrusted_line)
-                maybe_name, text = line.split(' ', 1)
-                suffix = len(":out:")
-                if maybe_name[:-suffix] in rows.keys():
-                    curr_name_out = maybe_name[:-suffix]
+                # output of a qube starts with `<name>:out: `
+                maybe_name, sep, text = line.partition(' ')
+                if sep and maybe_name.endswith(":out:"):
+                    maybe_name = maybe_name[:-len(":out:")]
+                    if maybe_name in rows:
+                        curr_name_out = maybe_name
+                else:
+                    text = line
                 if curr_name_out:
                     rows[curr_name_out].append_text_view(text)
                 if (self.update_details.active_row is not None and
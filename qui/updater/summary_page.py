@@ -19,8 +19,10 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
 # USA.
 import asyncio
+import functools
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from gettext import ngettext
 
@@ -33,15 +35,21 @@ from typing import Optional, Any
 import qubesadmin
 from qubesadmin.events.utils import wait_for_domain_shutdown
 
-from qubes_config.widgets.gtk_utils import load_icon, show_dialog, \
+from qubes_config.widgets.gtk_utils import show_dialog, \
     show_dialog_with_icon, show_error, RESPONSES_OK
 from qubes_config.widgets.utils import get_boolean_feature
 from qui.updater.utils import disable_checkboxes, pass_through_event_window, \
-    HeaderCheckbox, QubeClass, QubeName, \
-    RowWrapper, ListWrapper, on_head_checkbox_toggled
+    HeaderCheckbox, QubeName, \
+    RowWrapper, ListWrapper, on_head_checkbox_toggled, load_qube_icon
 
 from locale import gettext as l
 
+_INFO_NONE = ''
+_INFO_SHUTDOWN = \
+    'This qube and all running applications within will be shutdown'
+_INFO_EXCLUDED = '<span foreground="red">This qube has been explicitly ' \
+                 'disabled from restarting in settings</span>'
+
 
 class SummaryPage:
     """
@@ -114,11 +122,8 @@ class SummaryPage:
         self.refresh_buttons()
 
     def refresh_buttons(self):
-        """Refresh additional info column and finish button info."""
-        for row in self.list_store:
-            row.refresh_additional_info()
-        selected_num = sum(
-            row.selected for row in self.list_store)
+        """Refresh header checkbox and finish button info."""
+        selected_num = self.list_store.selected_num
         if selected_num == 0:
             self.head_checkbox.state = HeaderCheckbox.NONE
         elif selected_num == len(self.list_store):
@@ -140,8 +145,35 @@ class SummaryPage:
         If the user has selected any vms that do not match the defined states,
         the cycle will start from (1).
         """
-        on_head_checkbox_toggled(
-            self.list_store, self.head_checkbox, self.select_rows)
+        if len(self.list_store) == 0:
+            on_head_checkbox_toggled(
+                self.list_store, self.head_checkbox, self.select_rows)
+            return
+
+        # predict the number of selected rows for the next states
+        # from the number of rows of each type, and select rows only once
+        counts = self._count_rows_by_type()
+        selected_num_old = self.list_store.selected_num
+        for _ in range(4):
+            self.head_checkbox.next_state()
+            if self._selected_num_for(counts) != selected_num_old:
+                break
+        self.select_rows()
+        self.head_checkbox.set_buttons(self.list_store.selected_num)
+
+    def _count_rows_by_type(self):
+        """Returns number of appvms in list per `AppVMType`."""
+        counts = {AppVMType.SERVICEVM: 0, AppVMType.NON_SERVICEVM: 0,
+                  AppVMType.EXCLUDED: 0}
+        for row in self.list_store:
+            counts[row_type(row)] += 1
+        return counts
+
+    def _selected_num_for(self, counts):
+        """Returns number of rows `select_rows` would select in this state."""
+        allowed = self.head_checkbox.allowed_mask
+        return sum(num for vm_type, num in counts.items()
+                   if is_type_allowed(vm_type, allowed))
 
     @property
     def is_populated(self) -> bool:
@@ -195,25 +227,32 @@ class SummaryPage:
         self.summary_list.set_model(vm_updated.list_store_raw)
         self.updated_tmpls = [
             row for row in vm_updated
-            if bool(row.status)
-            and QubeClass[row.vm.klass] == QubeClass.TemplateVM
+            if row.status and row.vm.klass == 'TemplateVM'
         ]
-        possibly_changed_vms = set()
-        for template in self.updated_tmpls:
-            possibly_changed_vms.update(template.vm.derived_vms)
-
-        self.list_store = ListWrapper(
-            RestartRowWrapper, self.restart_list.get_model())
-
-        for vm in possibly_changed_vms:
-            if vm.is_running() and (
-                    vm.klass != 'DispVM' or not vm.auto_cleanup):
-                self.list_store.append_vm(vm)
-
-        if settings.restart_service_vms:
-            self.head_checkbox.allow_service_vms()
-        if settings.restart_other_vms:
-            self.head_checkbox.allow_non_service_vms()
+        model = self.restart_list.get_model()
+        self.list_store = ListWrapper(RestartRowWrapper, model)
+
+        if self.updated_tmpls:
+            possibly_changed_vms = {}
+            for template in self.updated_tmpls:
+                for vm in template.vm.derived_vms:
+                    possibly_changed_vms.setdefault(vm.name, vm)
+
+            # detach the model, so the view is not updated after every row
+            self.restart_list.set_model(None)
+            self.list_store.extend_vms(
+                vm for vm in get_running(possibly_changed_vms.values())
+                if vm.klass != 'DispVM' or not vm.auto_cleanup)
+            self.restart_list.set_model(model)
+            fetch_restart_features(self.list_store)
+
+        self.apply_settings(restart, settings)
+        self.select_rows()
+
+    def apply_settings(self, restart, settings):
+        """Set which appvms are allowed to restart according to settings."""
+        self.head_checkbox.allow_service_vms(settings.restart_service_vms)
+        self.head_checkbox.allow_non_service_vms(settings.restart_other_vms)
         if not restart:
             self.head_checkbox.state = HeaderCheckbox.NONE
         else:
@@ -221,21 +260,11 @@ class SummaryPage:
                 self.head_checkbox.state = HeaderCheckbox.SAFE
             if settings.restart_other_vms:
                 self.head_checkbox.state = HeaderCheckbox.EXTENDED
-        self.select_rows()
 
     def select_rows(self):
+        allowed = self.head_checkbox.allowed_mask
         for row in self.list_store:
-            row.selected = (
-                    row.is_service_qube
-                    and not row.is_excluded
-                    and AppVMType.SERVICEVM in self.head_checkbox.allowed
-                    or
-                    not row.is_service_qube
-                    and not row.is_excluded
-                    and AppVMType.NON_SERVICEVM in self.head_checkbox.allowed
-                    or
-                    AppVMType.EXCLUDED in self.head_checkbox.allowed
-            )
+            row.selected = is_type_allowed(row_type(row), allowed)
 
     def restart_selected_vms(self):
         self.log.debug("Start restarting")
@@ -276,17 +305,16 @@ class SummaryPage:
 
     def perform_restart(self):
 
-        tmpls_to_shutdown = [row.vm
-                             for row in self.updated_tmpls
-                             if row.vm.is_running()]
-        to_restart = [qube_row.vm
-                      for qube_row in self.list_store
-                      if qube_row.selected
-                      and qube_row.is_service_qube]
-        to_shutdown = [qube_row.vm
-                       for qube_row in self.list_store
-                       if qube_row.selected
-                       and not qube_row.is_service_qube]
+        tmpls_to_shutdown = get_running(row.vm for row in self.updated_tmpls)
+        to_restart = []
+        to_shutdown = []
+        for qube_row in self.list_store:
+            if not qube_row.selected:
+                continue
+            if qube_row.is_service_qube:
+                to_restart.append(qube_row.vm)
+            else:
+                to_shutdown.append(qube_row.vm)
 
         if not any([tmpls_to_shutdown, to_restart, to_shutdown]):
             self.status = RestartStatus.NOTHING_TO_DO
@@ -294,48 +322,72 @@ class SummaryPage:
 
         # clear err and perform shutdown/start
         self.err = ''
-        self.shutdown_domains(tmpls_to_shutdown)
-        self.restart_vms(to_restart)
-        self.shutdown_domains(to_shutdown)
+        asyncio.run(self._perform_restart(
+            tmpls_to_shutdown, to_restart, to_shutdown))
 
         if not self.err:
             self.status = RestartStatus.OK
         else:
             self.status = RestartStatus.ERROR
 
-    def shutdown_domains(self, to_shutdown):
+    async def _perform_restart(self, tmpls_to_shutdown, to_restart,
+                               to_shutdown):
+        """
+        Shut down templates, restart service qubes and shut down other appvms.
+
+        The steps run one after another: appvms may use the restarted
+        service qubes (e.g. as netvm). Qubes within a step are handled
+        concurrently.
+        """
+        await self._shutdown_domains(tmpls_to_shutdown)
+        await self._restart_vms(to_restart)
+        await self._shutdown_domains(to_shutdown)
+
+    async def _shutdown_domains(self, to_shutdown):
         """
-        Try to shut down vms and wait to finish.
+        Request shutdown of all vms at once, then wait for them to finish.
         """
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(
+                None, functools.partial(vm.shutdown, force=True))
+              for vm in to_shutdown),
+            return_exceptions=True)
+
         wait_for = []
-        for vm in to_shutdown:
-            try:
-                vm.shutdown(force=True)
+        for vm, result in zip(to_shutdown, results):
+            if isinstance(result, qubesadmin.exc.QubesVMError):
+                self.err += vm.name + " cannot shutdown: " + str(result) + '\n'
+                self.log.error("Cannot shutdown %s because %s",
+                               vm.name, str(result))
+            elif isinstance(result, BaseException):
+                raise result
+            else:
                 wait_for.append(vm)
                 self.log.info("Shutdown %s", vm.name)
-            except qubesadmin.exc.QubesVMError as err:
-                self.err += vm.name + " cannot shutdown: " + str(err) + '\n'
-                self.log.error("Cannot shutdown %s because %s",
-                               vm.name, str(err))
 
-        asyncio.run(wait_for_domain_shutdown(wait_for))
+        await wait_for_domain_shutdown(wait_for)
 
         return wait_for
 
-    def restart_vms(self, to_restart):
-        """
-        Try to restart vms.
-        """
-        shutdowns = self.shutdown_domains(to_restart)
-
-        # restart shutdown qubes
-        for vm in shutdowns:
-            try:
-                vm.start()
+    async def _restart_vms(self, to_restart):
+        shutdowns = await self._shutdown_domains(to_restart)
+
+        # restart shutdown qubes, qubesd handles concurrent starts
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(None, vm.start) for vm in shutdowns),
+            return_exceptions=True)
+
+        for vm, result in zip(shutdowns, results):
+            if isinstance(result, qubesadmin.exc.QubesVMError):
+                self.err += vm.name + " cannot start: " + str(result) + '\n'
+                self.log.error("Cannot start %s because %s",
+                               vm.name, str(result))
+            elif isinstance(result, BaseException):
+                raise result
+            else:
                 self.log.info("Restart %s", vm.name)
-            except qubesadmin.exc.QubesVMError as err:
-                self.err += vm.name + " cannot start: " + str(err) + '\n'
-                self.log.error("Cannot start %s because %s", vm.name, str(err))
 
     def _show_status_dialog(self):
         if self.status == RestartStatus.OK:
@@ -354,6 +406,31 @@ class SummaryPage:
             self.log.error("Restart error: %s", self.err)
 
 
+def get_running(vms) -> list:
+    """
+    Returns running qubes from `vms`.
+
+    Power state of each qube is a separate call to qubesd, so the calls are
+    made in parallel instead of one after another.
+    """
+    vms = list(vms)
+    with ThreadPoolExecutor() as executor:
+        is_running = list(executor.map(lambda vm: vm.is_running(), vms))
+    return [vm for vm, running in zip(vms, is_running) if running]
+
+
+def fetch_restart_features(rows):
+    """
+    Fetch features deciding about the restart of `rows` in parallel.
+
+    The results are cached by the rows, so selecting rows afterwards does
+    not wait for qubesd once per row.
+    """
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(
+            lambda row: (row.is_service_qube, row.is_excluded), rows))
+
+
 class RestartRowWrapper(RowWrapper):
     COLUMN_NUM = 5
     _SELECTION = 1
@@ -364,11 +441,15 @@ class RestartRowWrapper(RowWrapper):
     def __init__(self, list_store, vm, _selection: Any):
         raw_row = [
             False,
-            load_icon(vm.icon),
+            load_qube_icon(vm.icon),
             QubeName(vm.name, str(vm.label)),
             '',
         ]
         super().__init__(list_store, vm, raw_row)
+        # features are fetched from qubesd on first use and do not change
+        # while the summary page is shown
+        self._is_service_qube: Optional[bool] = None
+        self._is_excluded: Optional[bool] = None
 
     @property
     def selected(self):
@@ -376,18 +457,18 @@ class RestartRowWrapper(RowWrapper):
 
     @selected.setter
     def selected(self, value):
-        self.raw_row[self._SELECTION] = value
-        self.refresh_additional_info()
+        if self._set_selection(value):
+            self.refresh_additional_info()
 
     def refresh_additional_info(self):
-        self.raw_row[RestartRowWrapper._ADDITIONAL_INFO] = ''
-        if self.selected and not self.is_service_qube:
-            self.raw_row[RestartRowWrapper._ADDITIONAL_INFO] = \
-                'This qube and all running applications within will be shutdown'
-        if self.selected and self.is_excluded:
-            self.raw_row[RestartRowWrapper._ADDITIONAL_INFO] = \
-                '<span foreground="red">This qube has been explicitly ' \
-                'disabled from restarting in settings</span>'
+        info = _INFO_NONE
+        if self.selected:
+            if self.is_excluded:
+                info = _INFO_EXCLUDED
+            elif not self.is_service_qube:
+                info = _INFO_SHUTDOWN
+        if self.raw_row[self._ADDITIONAL_INFO] != info:
+            self.raw_row[self._ADDITIONAL_INFO] = info
 
     @property
     def icon(self):
@@ -407,17 +488,42 @@ class RestartRowWrapper(RowWrapper):
 
     @property
     def is_service_qube(self):
-        return get_boolean_feature(self.vm, 'servicevm', False)
+        if self._is_service_qube is None:
+            self._is_service_qube = get_boolean_feature(
+                self.vm, 'servicevm', False)
+        return self._is_service_qube
 
     @property
     def is_excluded(self):
-        return not get_boolean_feature(self.vm, 'restart-after-update', True)
+        if self._is_excluded is None:
+            self._is_excluded = not get_boolean_feature(
+                self.vm, 'restart-after-update', True)
+        return self._is_excluded
 
 
 class AppVMType:
-    SERVICEVM = 0
-    NON_SERVICEVM = 1
-    EXCLUDED = 2
+    """Bit flags of appvm types allowed to be selected."""
+    SERVICEVM = 1
+    NON_SERVICEVM = 2
+    EXCLUDED = 4
+
+
+def row_type(row) -> int:
+    """Returns `AppVMType` of the restart row."""
+    if row.is_excluded:
+        return AppVMType.EXCLUDED
+    if row.is_service_qube:
+        return AppVMType.SERVICEVM
+    return AppVMType.NON_SERVICEVM
+
+
+def is_type_allowed(vm_type: int, allowed: int) -> bool:
+    """
+    Returns True if appvms of `vm_type` should be selected.
+
+    Allowing excluded appvms allows all the other types too.
+    """
+    return bool(allowed & (vm_type | AppVMType.EXCLUDED))
 
 
 class RestartStatus(Enum):
@@ -433,6 +539,15 @@ class RestartHeaderCheckbox(HeaderCheckbox):
                          [None, None, AppVMType.EXCLUDED])
         self.next_button = next_button
 
+    @property
+    def allowed_mask(self) -> int:
+        """Currently allowed appvm types as `AppVMType` bit flags."""
+        mask = 0
+        for vm_type in self.allowed:
+            if vm_type is not None:
+                mask |= vm_type
+        return mask
+
     def allow_service_vms(self, value=True):
         if value:
             self._allowed[0] = AppVMType.SERVICEVM
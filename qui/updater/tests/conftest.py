@@ -21,6 +21,7 @@
  reachable by all tests"""
 import pytest
 import importlib.resources
+from unittest.mock import Mock
 
 from qubes_config.tests.conftest import add_dom0_vm_property, \
     add_dom0_text_property, add_dom0_feature, add_expected_vm, \
@@ -30,7 +31,8 @@ from qubesadmin.tests import QubesTest
 import gi
 
 from qui.updater.intro_page import UpdateRowWrapper
-from qui.updater.summary_page import RestartRowWrapper
+from qui.updater.progress_page import ProgressPage
+from qui.updater.summary_page import RestartRowWrapper, SummaryPage
 from qui.updater.utils import ListWrapper
 
 gi.require_version('Gtk', '3.0')
@@ -140,15 +142,20 @@ def test_qapp():
     return qapp
 
 
+@pytest.fixture(scope="session")
+def _updater_glade():
+    """Content of the actual glade file, read once for all tests"""
+    glade_ref = (importlib.resources.files('qui') /
+                 'updater.glade')
+    return glade_ref.read_text(encoding='utf-8')
+
+
 @pytest.fixture
-def real_builder():
+def real_builder(_updater_glade):
     """Gtk builder with actual config glade file registered"""
     builder = Gtk.Builder()
     builder.set_translation_domain("desktop-linux-manager")
-    glade_ref = (importlib.resources.files('qui') /
-                 'updater.glade')
-    with importlib.resources.as_file(glade_ref) as path:
-        builder.add_from_file(str(path))
+    builder.add_from_string(_updater_glade)
     return builder
 
 
@@ -215,25 +222,40 @@ def mock_text_view():
 
 
 @pytest.fixture
-def mock_list_store():
-    class MockListStore:
-        def __init__(self):
-            self.raw_rows = []
+def progress_page(real_builder, mock_label, mock_next_button,
+                  mock_cancel_button):
+    """ProgressPage built from the actual glade file"""
+    return ProgressPage(real_builder, Mock(), mock_label, mock_next_button,
+                        mock_cancel_button)
+
 
+@pytest.fixture
+def summary_page(real_builder, mock_next_button, mock_cancel_button):
+    """SummaryPage built from the actual glade file"""
+    return SummaryPage(real_builder, Mock(), mock_next_button,
+                       mock_cancel_button,
+                       back_by_row_selection=lambda *args: None  # callback
+                       )
+
+
+@pytest.fixture
+def mock_list_store():
+    class MockListStore(list):
         def get_model(self):
             return self
 
         def get_iter(self, path):
             return path[0]
 
-        def __getitem__(self, item):
-            return self.raw_rows[item]
+        def remove(self, idx):
+            del self[idx]
 
-        def append(self, row):
-            self.raw_rows.append(row)
+        def get_sort_column_id(self):
+            return None, None
 
-        def remove(self, idx):
-            self.raw_rows.remove(idx)
+        def set_sort_column_id(self, _col, _order):
+            """not used in tests"""
+            pass
 
         def set_sort_func(self, _col, _sort_func, _data):
             """not used in tests"""
@@ -257,26 +279,24 @@ def mock_settings():
 @pytest.fixture
 def all_vms_list(test_qapp, mock_list_store):
     result = ListWrapper(UpdateRowWrapper, mock_list_store)
-    for vm in test_qapp.domains:
-        result.append_vm(vm)
+    result.extend_vms(test_qapp.domains)
     return result
 
 
 @pytest.fixture
 def updatable_vms_list(test_qapp, mock_list_store):
     result = ListWrapper(UpdateRowWrapper, mock_list_store)
-    for vm in test_qapp.domains:
-        if vm.klass in ("AdminVM", "TemplateVM", "StandaloneVM"):
-            result.append_vm(vm)
+    result.extend_vms(
+        vm for vm in test_qapp.domains
+        if vm.klass in ("AdminVM", "TemplateVM", "StandaloneVM"))
     return result
 
 
 @pytest.fixture
 def appvms_list(test_qapp, mock_list_store):
     result = ListWrapper(RestartRowWrapper, mock_list_store)
-    for vm in test_qapp.domains:
-        if vm.klass == "AppVM":
-            result.append_vm(vm)
+    result.extend_vms(
+        vm for vm in test_qapp.domains if vm.klass == "AppVM")
     return result
 
 
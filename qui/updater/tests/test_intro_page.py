@@ -25,9 +25,9 @@ from unittest.mock import patch
 from unittest.mock import Mock
 
 from qubes_config.tests.conftest import test_qapp_impl
-from qui.updater.intro_page import IntroPage, UpdateRowWrapper, UpdatesAvailable
+from qui.updater.intro_page import IntroPage, UpdatesAvailable
 from qui.updater.updater import parse_args
-from qui.updater.utils import ListWrapper, HeaderCheckbox
+from qui.updater.utils import HeaderCheckbox
 
 @patch('subprocess.check_output')
 def test_populate_vm_list(
@@ -48,7 +48,9 @@ def test_populate_vm_list(
 
     assert sut.is_populated
     assert len(sut.list_store) == 4
-    assert len(sut.get_vms_to_update()) == 1
+    to_update = sut.get_vms_to_update()
+    assert len(to_update) == 1
+    assert to_update.selected_num == sum(row.selected for row in to_update)
 
     test_qapp.expected_calls[
         ('fedora-36', "admin.vm.feature.Get", 'updates-available', None)
@@ -68,15 +70,13 @@ def test_populate_vm_list(
 )
 def test_on_header_toggled(
         real_builder, test_qapp, updates_available, expectations,
-        mock_next_button, mock_settings, mock_list_store
+        mock_next_button, mock_settings, all_vms_list
 ):
     mock_log = Mock()
     sut = IntroPage(real_builder, mock_log, mock_next_button)
 
     # populate_vm_list
-    sut.list_store = ListWrapper(UpdateRowWrapper, mock_list_store)
-    for vm in test_qapp.domains:
-        sut.list_store.append_vm(vm)
+    sut.list_store = all_vms_list
 
     assert len(sut.list_store) == 12
 
@@ -91,8 +91,9 @@ def test_on_header_toggled(
     sut.head_checkbox.state = HeaderCheckbox.NONE
 
     for expected in expectations:
-        selected_num = len([row for row in sut.list_store if row.selected])
+        selected_num = sum(row.selected for row in sut.list_store)
         assert selected_num == expected
+        assert sut.list_store.selected_num == expected
         assert sut.checkbox_column_button.get_inconsistent() \
                and expected not in (0, 12) \
                or sut.checkbox_column_button.get_active() \
@@ -105,15 +106,13 @@ def test_on_header_toggled(
 
 def test_on_checkbox_toggled(
         real_builder, test_qapp,
-        mock_next_button, mock_settings, mock_list_store
+        mock_next_button, mock_settings, all_vms_list
 ):
     mock_log = Mock()
     sut = IntroPage(real_builder, mock_log, mock_next_button)
 
     # populate_vm_list
-    sut.list_store = ListWrapper(UpdateRowWrapper, mock_list_store)
-    for vm in test_qapp.domains:
-        sut.list_store.append_vm(vm)
+    sut.list_store = all_vms_list
 
     assert len(sut.list_store) == 12
 
@@ -126,6 +125,7 @@ def test_on_checkbox_toggled(
     # no selected row
     assert not sut.checkbox_column_button.get_inconsistent()
     assert not sut.checkbox_column_button.get_active()
+    assert sut.list_store.selected_num == 0
 
     # only one row selected
     sut.on_checkbox_toggled(_emitter=None, path=(3,))
@@ -137,17 +137,20 @@ def test_on_checkbox_toggled(
 
     # almost all rows selected (except one)
     assert sut.checkbox_column_button.get_inconsistent()
+    assert sut.list_store.selected_num == len(sut.list_store) - 1
 
     sut.on_checkbox_toggled(_emitter=None, path=(3,))
 
     # all rows selected
     assert not sut.checkbox_column_button.get_inconsistent()
     assert sut.checkbox_column_button.get_active()
+    assert sut.list_store.selected_num == len(sut.list_store)
 
     sut.on_checkbox_toggled(_emitter=None, path=(3,))
 
     # almost all rows selected (except one)
     assert sut.checkbox_column_button.get_inconsistent()
+    assert sut.list_store.selected_num == len(sut.list_store) - 1
 
     for i in range(len(sut.list_store)):
         if i == 3:
@@ -157,100 +160,109 @@ def test_on_checkbox_toggled(
     # no selected row
     assert not sut.checkbox_column_button.get_inconsistent()
     assert not sut.checkbox_column_button.get_active()
+    assert sut.list_store.selected_num == 0
 
 
-_domains = {vm.name for vm in test_qapp_impl().domains}
-_templates = {vm.name for vm in test_qapp_impl().domains
-              if vm.klass == "TemplateVM"}
-_standalones = {vm.name for vm in test_qapp_impl().domains
-                if vm.klass == "StandaloneVM"}
+_qubes = list(test_qapp_impl().domains)
+_domains = {vm.name for vm in _qubes}
+_templates = {vm.name for vm in _qubes if vm.klass == "TemplateVM"}
+_standalones = {vm.name for vm in _qubes if vm.klass == "StandaloneVM"}
 _tmpls_and_stndas = _templates.union(_standalones)
 _non_derived_qubes = {"dom0"}.union(_tmpls_and_stndas)
 _derived_qubes = _domains.difference(_non_derived_qubes)
+# mocked outputs of `qubes-vm-update --dry-run`, sorted to be deterministic
+_tmpls_and_stndas_out = ",".join(sorted(_tmpls_and_stndas)).encode()
+_derived_qubes_out = ",".join(sorted(_derived_qubes)).encode()
+_standalones_out = ",".join(sorted(_standalones)).encode()
+_templates_but_f36_out = ",".join(
+    sorted(_templates.difference({"fedora-36"}))).encode()
+
+
+def _dry_run_output(tmpls_and_stndas: bytes, derived_qubes: bytes) -> bytes:
+    """Mocked output of `qubes-vm-update --dry-run`"""
+    lines = []
+    if tmpls_and_stndas:
+        lines.append(b'Following templates and standalones will be updated: '
+                     + tmpls_and_stndas)
+    if derived_qubes:
+        lines.append(b'Following qubes will be updated: ' + derived_qubes)
+    return b'\n'.join(lines)
 
 
 @patch('subprocess.check_output')
 @pytest.mark.parametrize(
     # args: for `qubes-vm-update`
     # selection is based on a result of `qubes-vm-update --dry-run *args`
-    # templates_and_standalones: mocked selection of templates and standalones
-    # derived_qubes: mocked selection of derived qubes
+    # dry_run_output: mocked selection of templates, standalones
+    #   and derived qubes
     # expected_selection: gui should select what
-    "args, tmpls_and_stndas, derived_qubes, expected_selection",
+    "args, dry_run_output, expected_selection",
     (
         # `qubes-update-gui --all`
         # Target all updatable VMs (AdminVM, TemplateVMs and StandaloneVMs)
         pytest.param(
-            ('--all',), ",".join(_tmpls_and_stndas).encode(),
-            ",".join(_derived_qubes).encode(), _non_derived_qubes),
+            ('--all',),
+            _dry_run_output(_tmpls_and_stndas_out, _derived_qubes_out),
+            _non_derived_qubes),
         # `qubes-update-gui --update-if-stale 10`
         # Target all TemplateVMs and StandaloneVMs with known updates or for
         # which last update check was more than <10> days ago.
         pytest.param(
-            ('--update-if-stale', '10'), b'fedora-36', b'', {'fedora-36'}),
+            ('--update-if-stale', '10'), _dry_run_output(b'fedora-36', b''),
+            {'fedora-36'}),
         # `qubes-update-gui --targets dom0,fedora-36`
         # Comma separated list of VMs to target
         pytest.param(
-            ('--targets', 'dom0,fedora-36'), b'fedora-36',
-            b'', {'dom0', 'fedora-36'}),
+            ('--targets', 'dom0,fedora-36'),
+            _dry_run_output(b'fedora-36', b''), {'dom0', 'fedora-36'}),
         # `qubes-update-gui --standalones`
         # Target all StandaloneVMs
         pytest.param(
-            ('--standalones',), b'',
-            ",".join(_standalones).encode(), _standalones),
+            ('--standalones',), _dry_run_output(b'', _standalones_out),
+            _standalones),
         # `qubes-update-gui --dom0`
         # Target dom0
-        pytest.param(('--dom0',), b'', b'', {'dom0'}),
+        pytest.param(('--dom0',), b'', {'dom0'}),
         # `qubes-update-gui --dom0 --skip dom0`
         # Comma separated list of VMs to be skipped,
         # works with all other options.
-        pytest.param(('--dom0', '--skip', 'dom0'), b'', b'', set()),
+        pytest.param(('--dom0', '--skip', 'dom0'), b'', set()),
         # `qubes-update-gui --skip dom0`
-        pytest.param(('--skip', 'dom0'), b'', b'', set()),
+        pytest.param(('--skip', 'dom0'), b'', set()),
         # `qubes-update-gui --targets dom0 --skip dom0`
         # the same as `qubes-update-gui --dom0 --skip dom0`
         pytest.param(
-            ('--targets', 'dom0', '--skip', 'dom0'), b'', b'', set()),
+            ('--targets', 'dom0', '--skip', 'dom0'), b'', set()),
         # `qubes-update-gui --templates dom0 --skip fedora-36,garbage-name`
         pytest.param(('--templates', '--skip', 'fedora-36,garbage-name'),
-                     ",".join(_templates.difference({"fedora-36"})).encode(),
-                     b'',
+                     _dry_run_output(_templates_but_f36_out, b''),
                      _templates.difference({"fedora-36"})),
     ),
 )
 def test_select_rows_ignoring_conditions(
         mock_subprocess,
-        args, tmpls_and_stndas, derived_qubes, expected_selection,
+        args, dry_run_output, expected_selection,
         real_builder, test_qapp, mock_next_button, mock_settings,
-        mock_list_store
+        all_vms_list
 ):
     mock_log = Mock()
     sut = IntroPage(real_builder, mock_log, mock_next_button)
 
     # populate_vm_list
-    sut.list_store = ListWrapper(UpdateRowWrapper, mock_list_store)
-    for vm in test_qapp.domains:
-        sut.list_store.append_vm(vm)
+    sut.list_store = all_vms_list
 
     assert len(sut.list_store) == 12
 
-    result = b''
-    if tmpls_and_stndas:
-        result += (b'Following templates and standalones will be updated: '
-                   + tmpls_and_stndas)
-    if derived_qubes:
-        if result:
-            result += b'\n'
-        result += b'Following qubes will be updated: ' + derived_qubes
-    mock_subprocess.return_value = result
+    mock_subprocess.return_value = dry_run_output
 
     cliargs = parse_args(args)
     sut.select_rows_ignoring_conditions(cliargs, test_qapp.domains['dom0'])
     to_update = {row.name for row in sut.list_store if row.selected}
 
     assert to_update == expected_selection
+    assert sut.list_store.selected_num == len(expected_selection)
 
-    at_most_dom0_selected = not tmpls_and_stndas + derived_qubes
+    at_most_dom0_selected = not dry_run_output
     if at_most_dom0_selected:
         mock_subprocess.assert_not_called()
 
@@ -18,34 +18,53 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
 # USA.
-import gi
 import subprocess
 
 from unittest.mock import patch, call, Mock
 
 import pytest
 
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gtk
 
 from qui.updater.intro_page import UpdateRowWrapper
-from qui.updater.progress_page import ProgressPage, QubeUpdateDetails
+from qui.updater.progress_page import QubeUpdateDetails
 from qui.updater.tests.conftest import mock_settings
 from qui.updater.utils import ListWrapper, UpdateStatus
 
 
+# expected `qubes-vm-update` call for templates and standalones of test_qapp
+UPDATE_TEMPLATES_CMD = ('qubes-vm-update',
+                        '--show-output',
+                        '--just-print-progress',
+                        '--targets',
+                        'fedora-35,fedora-36,test-standalone')
+
+
+class MockPorc:
+    def __init__(self, finish_after_n_polls=2):
+        self.polls = 0
+        self.finish_after_n_polls = finish_after_n_polls
+
+    def wait(self):
+        """Mock  waiting."""
+        pass
+
+    def poll(self):
+        """After several polls return 0 (process finished)."""
+        self.polls += 1
+        if self.polls < self.finish_after_n_polls:
+            return None
+        return 0
+
+
 @patch('threading.Thread')
 def test_init_update(
-        mock_threading, mock_thread, real_builder, test_qapp,
+        mock_threading, mock_thread, progress_page, test_qapp,
         mock_next_button, mock_cancel_button, mock_label, mock_tree_view,
         all_vms_list):
 
     mock_threading.return_value = mock_thread
-    mock_log = Mock()
-    sut = ProgressPage(
-        real_builder, mock_log, mock_label, mock_next_button, mock_cancel_button
-    )
+    sut = progress_page
 
     sut.progress_list = mock_tree_view
 
@@ -65,27 +84,20 @@ def test_init_update(
 
 @patch('gi.repository.GLib.idle_add')
 def test_perform_update(
-        idle_add, real_builder,
+        idle_add, progress_page,
         mock_next_button, mock_cancel_button, mock_label, updatable_vms_list
 ):
-    mock_log = Mock()
-    sut = ProgressPage(
-        real_builder, mock_log, mock_label, mock_next_button, mock_cancel_button
-    )
+    sut = progress_page
 
     sut.vms_to_update = updatable_vms_list
 
-    class VMConsumer:
-        def __call__(self, vm_rows, *args, **kwargs):
-            self.vm_rows = vm_rows
-
-    sut.update_admin_vm = VMConsumer()
-    sut.update_templates = VMConsumer()
+    sut.update_admin_vm = Mock()
+    sut.update_templates = Mock()
 
     sut.perform_update(mock_settings)
 
-    assert len(sut.update_admin_vm.vm_rows) == 1
-    assert len(sut.update_templates.vm_rows) == 3
+    assert len(sut.update_admin_vm.call_args.args[0]) == 1
+    assert len(sut.update_templates.call_args.args[0]) == 3
 
     calls = [call(mock_next_button.set_sensitive, True),
              call(mock_label.set_text, "Update finished"),
@@ -103,19 +115,14 @@ def test_perform_update(
     )
 )
 def test_update_admin_vm(
-        mock_subprocess, idle_add,  interrupted, real_builder, test_qapp,
-        mock_next_button, mock_cancel_button, mock_label, mock_text_view,
-        mock_list_store
+        mock_subprocess, idle_add,  interrupted, progress_page, test_qapp,
+        mock_text_view, mock_list_store
 ):
-    mock_log = Mock()
-    sut = ProgressPage(
-        real_builder, mock_log, mock_label, mock_next_button, mock_cancel_button
-    )
+    sut = progress_page
 
     admins = ListWrapper(UpdateRowWrapper, mock_list_store)
-    for vm in test_qapp.domains:
-        if vm.klass in ("AdminVM",):
-            admins.append_vm(vm)
+    admins.extend_vms(
+        vm for vm in test_qapp.domains if vm.klass in ("AdminVM",))
 
     sut.update_details.progress_textview = mock_text_view
     # chose vm to show details
@@ -141,13 +148,10 @@ def test_update_admin_vm(
     )
 )
 def test_update_templates(
-        idle_add, interrupted, real_builder, updatable_vms_list,
-        mock_next_button, mock_cancel_button, mock_label, mock_text_view
+        idle_add, interrupted, progress_page, updatable_vms_list,
+        mock_text_view
 ):
-    mock_log = Mock()
-    sut = ProgressPage(
-        real_builder, mock_log, mock_label, mock_next_button, mock_cancel_button
-    )
+    sut = progress_page
 
     sut.do_update_templates = Mock()
     total_progress = []
@@ -176,102 +180,170 @@ def test_update_templates(
 
 @patch('subprocess.Popen')
 def test_do_update_templates(
-        mock_subprocess, real_builder, test_qapp,
-        mock_next_button, mock_cancel_button, mock_label, mock_list_store,
+        mock_subprocess, progress_page, test_qapp, mock_list_store,
         mock_settings
 ):
-    class MockPorc:
-        def __init__(self, finish_after_n_polls=2):
-            self.polls = 0
-            self.finish_after_n_polls = finish_after_n_polls
-
-        def wait(self):
-            """Mock  waiting."""
-            pass
-
-        def poll(self):
-            """After several polls return 0 (process finished)."""
-            self.polls += 1
-            if self.polls < self.finish_after_n_polls:
-                return None
-            return 0
-
-
     mock_subprocess.return_value = MockPorc()
 
-    mock_log = Mock()
-    sut = ProgressPage(
-        real_builder, mock_log, mock_label, mock_next_button, mock_cancel_button
-    )
+    sut = progress_page
     sut.read_stderrs = lambda *_args, **_kwargs: None
     sut.read_stdouts = lambda *_args, **_kwargs: None
 
     to_update = ListWrapper(UpdateRowWrapper, mock_list_store)
-    for vm in test_qapp.domains:
-        if vm.klass in ("TemplateVM", "StandaloneVM"):
-            to_update.append_vm(vm)
+    to_update.extend_vms(
+        vm for vm in test_qapp.domains
+        if vm.klass in ("TemplateVM", "StandaloneVM"))
 
     rows = {row.name: row for row in to_update}
 
     sut.do_update_templates(rows, mock_settings)
 
-    calls = [call(
-        ['qubes-vm-update',
-         '--show-output',
-         '--just-print-progress',
-         '--targets',
-         'fedora-35,fedora-36,test-standalone'],
-        stderr=subprocess.PIPE, stdout=subprocess.PIPE)]
+    calls = [call(list(UPDATE_TEMPLATES_CMD),
+                  stderr=subprocess.PIPE, stdout=subprocess.PIPE)]
     mock_subprocess.assert_has_calls(calls)
 
 
-def test_get_update_summary(
-        real_builder,
-        mock_next_button, mock_cancel_button, mock_label, updatable_vms_list
-):
-    mock_log = Mock()
-    sut = ProgressPage(
-        real_builder, mock_log, mock_label, mock_next_button, mock_cancel_button
+@patch('gi.repository.GLib.idle_add')
+@pytest.mark.parametrize(
+    # line: stderr line of `qubes-vm-update`
+    # method, value: expected update of the fedora-35 row, None if ignored
+    "line, method, value",
+    (
+        pytest.param(b"fedora-35 updating 42.7\n", "set_update_progress", 42,
+                     id="progress"),
+        pytest.param(b"fedora-35 done success\n", "set_status",
+                     UpdateStatus.Success, id="done"),
+        pytest.param(b"fedora-35 updating\n", None, None, id="2 tokens"),
+        pytest.param(b"fedora-35 updating 42 more\n", None, None,
+                     id="4 tokens"),
+        pytest.param(b"fedora-35 updating fast\n", None, None,
+                     id="non-numeric progress"),
+        pytest.param(b"fedora-35 done maybe\n", None, None,
+                     id="unknown status"),
     )
+)
+def test_handle_err_line(
+        idle_add, line, method, value, progress_page, updatable_vms_list
+):
+    sut = progress_page
+    rows = {row.name: row for row in updatable_vms_list
+            if row.vm.klass != "AdminVM"}
 
-    updatable_vms_list[0].set_status(UpdateStatus.NoUpdatesFound)
-    updatable_vms_list[1].set_status(UpdateStatus.Error)
-    updatable_vms_list[2].set_status(UpdateStatus.Cancelled)
-    updatable_vms_list[3].set_status(UpdateStatus.Success)
+    sut.handle_err_line(line, rows)
 
-    sut.vms_to_update = updatable_vms_list
+    if method is None:
+        idle_add.assert_not_called()
+    else:
+        idle_add.assert_any_call(getattr(rows["fedora-35"], method), value)
+
+
+@patch('time.sleep')
+@patch('subprocess.Popen')
+@patch('gi.repository.GLib.idle_add')
+def test_handle_err_line_total_progress(
+        idle_add, mock_subprocess, _mock_sleep, progress_page,
+        updatable_vms_list, mock_settings
+):
+    mock_subprocess.return_value = MockPorc()
+    sut = progress_page
+    sut.read_stderrs = lambda *_args, **_kwargs: None
+    sut.read_stdouts = lambda *_args, **_kwargs: None
+    rows = {row.name: row for row in updatable_vms_list
+            if row.vm.klass != "AdminVM"}
 
-    vm_updated_num, vm_no_updates_num, vm_failed_num = sut.get_update_summary()
+    def total_progress():
+        return [c.args[1] for c in idle_add.call_args_list
+                if c.args[0] == sut.set_total_progress]
 
-    assert vm_updated_num == 1
-    assert vm_no_updates_num == 1
-    assert vm_failed_num == 2
+    sut.do_update_templates(rows, mock_settings)
+    for line in (b"fedora-35 updating 30\n",
+                 b"fedora-35 updating 90\n",
+                 b"fedora-36 updating 60\n",
+                 b"test-standalone updating 100\n"):
+        sut.handle_err_line(line, rows)
 
+    assert total_progress() == pytest.approx([10, 30, 50, 250 / 3])
 
-def test_set_active_row(real_builder, updatable_vms_list):
-    sut = QubeUpdateDetails(real_builder)
-    row = updatable_vms_list[0]
-    sut.set_active_row(row)
+    # the next run starts counting from zero
+    idle_add.reset_mock()
+    sut.do_update_templates(rows, mock_settings)
+    sut.handle_err_line(b"fedora-36 updating 60\n", rows)
 
-    assert sut.details_label.get_text().strip() == "Details for"
-    assert sut.qube_label.get_text().strip() == str(row.name)
-    assert sut.qube_icon.get_visible()
-    assert sut.qube_label.get_visible()
-    assert sut.colon.get_visible()
-    assert sut.progress_scrolled_window.get_visible()
-    assert sut.progress_textview.get_visible()
-    assert sut.copy_button.get_visible()
+    assert total_progress() == pytest.approx([20])
 
 
-def test_set_active_row_none(real_builder):
+def test_read_stdouts(progress_page, updatable_vms_list):
+    sut = progress_page
+    rows = {row.name: row for row in updatable_vms_list
+            if row.vm.klass != "AdminVM"}
+    proc = Mock()
+    proc.stdout.readline.side_effect = [
+        b"no qube yet\n",
+        b"fedora-35:out: Installing foo\n",
+        b"continued without prefix\n",
+        b"continued with fedora-36:out: inside\n",
+        b"fedora-36:out: Nothing to do\n",
+        b"",
+    ]
+
+    sut.read_stdouts(proc, rows)
+
+    assert rows["fedora-35"].buffer == \
+           "Installing foo\ncontinued without prefix\n" \
+           "continued with fedora-36:out: inside\n"
+    assert rows["fedora-36"].buffer == "Nothing to do\n"
+    assert rows["test-standalone"].buffer == ""
+    proc.stdout.close.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    # statuses: set to consecutive rows of updatable_vms_list
+    # expected: (updated, no updates found, failed)
+    "statuses, expected",
+    (
+        pytest.param((UpdateStatus.NoUpdatesFound, UpdateStatus.Error,
+                      UpdateStatus.Cancelled, UpdateStatus.Success),
+                     (1, 1, 2), id="mixed"),
+        pytest.param((UpdateStatus.Success,) * 4, (4, 0, 0), id="success"),
+        pytest.param((UpdateStatus.NoUpdatesFound,) * 4, (0, 4, 0),
+                     id="no updates"),
+        pytest.param((UpdateStatus.Error, UpdateStatus.Cancelled) * 2,
+                     (0, 0, 4), id="failed"),
+    )
+)
+def test_get_update_summary(
+        statuses, expected, progress_page, updatable_vms_list
+):
+    sut = progress_page
+
+    for row, status in zip(updatable_vms_list, statuses):
+        row.set_status(status)
+
+    sut.vms_to_update = updatable_vms_list
+
+    assert sut.get_update_summary() == expected
+
+
+@pytest.mark.parametrize(
+    "row_idx",
+    (
+        pytest.param(0, id="row"),
+        pytest.param(None, id="none"),
+    )
+)
+def test_set_active_row(row_idx, real_builder, updatable_vms_list):
     sut = QubeUpdateDetails(real_builder)
+    row = None if row_idx is None else updatable_vms_list[row_idx]
 
-    sut.set_active_row(None)
+    sut.set_active_row(row)
 
-    assert sut.details_label.get_text() == "Select a qube to see details."
-    assert not sut.qube_icon.get_visible()
-    assert not sut.qube_label.get_visible()
-    assert not sut.colon.get_visible()
-    assert not sut.progress_scrolled_window.get_visible()
-    assert not sut.progress_textview.get_visible()
-    assert not sut.copy_button.get_visible()
+    visible = row is not None
+    if visible:
+        assert sut.details_label.get_text().strip() == "Details for"
+        assert sut.qube_label.get_text().strip() == str(row.name)
+    else:
+        assert sut.details_label.get_text() == "Select a qube to see details."
+    for widget in (sut.qube_icon, sut.qube_label, sut.colon,
+                   sut.progress_scrolled_window, sut.progress_textview,
+                   sut.copy_button):
+        assert widget.get_visible() == visible
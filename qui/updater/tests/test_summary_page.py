@@ -19,34 +19,27 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
 # USA.
 import pytest
-from unittest.mock import patch, call, Mock
+from unittest.mock import patch, call
 
-import gi
-gi.require_version('Gtk', '3.0')  # isort:skip
-from gi.repository import Gtk  # isort:skip
+from gi.repository import Gtk
 
 from qubes_config.widgets.gtk_utils import RESPONSES_OK
 from qui.updater.intro_page import UpdateRowWrapper
 
-from qui.updater.summary_page import SummaryPage, AppVMType, RestartStatus, \
+from qui.updater.summary_page import AppVMType, RestartStatus, \
     RestartRowWrapper
 from qui.updater.utils import HeaderCheckbox, UpdateStatus, ListWrapper
 
 
 @patch('qui.updater.summary_page.SummaryPage.refresh_buttons')
 def test_show(
-        refresh_buttons, real_builder, test_qapp, appvms_list,
-        mock_next_button, mock_cancel_button
+        refresh_buttons, summary_page, test_qapp, appvms_list
 ):
     test_qapp.expected_calls[
         ('test-blue', "admin.vm.feature.Get", 'restart-after-update', None)
     ] = b"0\x00" + "".encode()
 
-    mock_log = Mock()
-    sut = SummaryPage(
-        real_builder, mock_log, mock_next_button, mock_cancel_button,
-        back_by_row_selection=lambda *args: None  # callback
-    )
+    sut = summary_page
 
     sut.list_store = appvms_list
 
@@ -62,19 +55,12 @@ def test_show(
     refresh_buttons.assert_called_once()
 
 
-def test_on_header_toggled(
-        real_builder, test_qapp, appvms_list,
-        mock_next_button, mock_cancel_button
-):
+def test_on_header_toggled(summary_page, test_qapp, appvms_list):
     test_qapp.expected_calls[
         ('test-blue', "admin.vm.feature.Get", 'restart-after-update', None)
     ] = b"0\x00" + "".encode()
 
-    mock_log = Mock()
-    sut = SummaryPage(
-        real_builder, mock_log, mock_next_button, mock_cancel_button,
-        back_by_row_selection=lambda *args: None  # callback
-    )
+    sut = summary_page
 
     sut.list_store = appvms_list
     all_num = len(appvms_list)
@@ -86,8 +72,9 @@ def test_on_header_toggled(
     sut.head_checkbox.state = HeaderCheckbox.NONE
 
     for expected in (0, service_num, non_excluded_num, all_num, 0):
-        selected_num = len([row for row in sut.list_store if row.selected])
+        selected_num = sum(row.selected for row in sut.list_store)
         assert selected_num == expected
+        assert sut.list_store.selected_num == expected
         assert sut.head_checkbox_button.get_inconsistent() \
                and expected not in (0, all_num) \
                or sut.head_checkbox_button.get_active() \
@@ -98,15 +85,55 @@ def test_on_header_toggled(
         sut.on_header_toggled(None)
 
 
-def test_on_checkbox_toggled(
-        real_builder, test_qapp, appvms_list,
-        mock_next_button, mock_cancel_button, mock_settings
-):
-    mock_log = Mock()
-    sut = SummaryPage(
-        real_builder, mock_log, mock_next_button, mock_cancel_button,
-        back_by_row_selection=lambda *args: None  # callback
+# appvms of test_qapp by type, test-blue is excluded in tests below
+_SERVICE_QUBES = {"sys-firewall", "sys-net", "sys-usb"}
+_OTHER_QUBES = {"test-red", "test-vm", "vault"}
+_ALL_QUBES = _SERVICE_QUBES | _OTHER_QUBES | {"test-blue"}
+
+
+@pytest.mark.parametrize(
+    # selected: rows selected by the user before clicking on the header
+    # expected: rows selected after clicking on the header
+    "selected, expected",
+    (
+        pytest.param(set(), _SERVICE_QUBES, id="none"),
+        pytest.param({"test-blue"}, _SERVICE_QUBES, id="excluded"),
+        pytest.param({"sys-net", "test-blue"}, _SERVICE_QUBES,
+                     id="service and excluded"),
+        pytest.param(_SERVICE_QUBES, _SERVICE_QUBES | _OTHER_QUBES,
+                     id="service"),
+        pytest.param({"sys-net", "test-vm", "test-blue"},
+                     _SERVICE_QUBES | _OTHER_QUBES,
+                     id="as many as service"),
+        pytest.param(_ALL_QUBES, set(), id="all"),
     )
+)
+def test_on_header_toggled_after_selection(
+        selected, expected, summary_page, test_qapp, appvms_list
+):
+    test_qapp.expected_calls[
+        ('test-blue', "admin.vm.feature.Get", 'restart-after-update', None)
+    ] = b"0\x00" + "".encode()
+
+    sut = summary_page
+
+    sut.list_store = appvms_list
+    sut.head_checkbox._allowed[0] = AppVMType.SERVICEVM
+    sut.head_checkbox._allowed[1] = AppVMType.NON_SERVICEVM
+    sut.head_checkbox.state = HeaderCheckbox.NONE
+
+    for i, row in enumerate(sut.list_store):
+        if row.name in selected:
+            sut.on_checkbox_toggled(_emitter=None, path=(i,))
+
+    sut.on_header_toggled(None)
+
+    assert {row.name for row in sut.list_store if row.selected} == expected
+    assert sut.list_store.selected_num == len(expected)
+
+
+def test_on_checkbox_toggled(summary_page, test_qapp, appvms_list):
+    sut = summary_page
 
     sut.list_store = appvms_list
     sut.head_checkbox._allowed[0] = AppVMType.SERVICEVM
@@ -118,6 +145,7 @@ def test_on_checkbox_toggled(
     # no selected row
     assert not sut.head_checkbox_button.get_inconsistent()
     assert not sut.head_checkbox_button.get_active()
+    assert sut.list_store.selected_num == 0
 
     # only one row selected
     sut.on_checkbox_toggled(_emitter=None, path=(3,))
@@ -129,17 +157,20 @@ def test_on_checkbox_toggled(
 
     # almost all rows selected (except one)
     assert sut.head_checkbox_button.get_inconsistent()
+    assert sut.list_store.selected_num == len(sut.list_store) - 1
 
     sut.on_checkbox_toggled(_emitter=None, path=(3,))
 
     # all rows selected
     assert not sut.head_checkbox_button.get_inconsistent()
     assert sut.head_checkbox_button.get_active()
+    assert sut.list_store.selected_num == len(sut.list_store)
 
     sut.on_checkbox_toggled(_emitter=None, path=(3,))
 
     # almost all rows selected (except one)
     assert sut.head_checkbox_button.get_inconsistent()
+    assert sut.list_store.selected_num == len(sut.list_store) - 1
 
     for i in range(len(sut.list_store)):
         if i == 3:
@@ -149,6 +180,7 @@ def test_on_checkbox_toggled(
     # no selected row
     assert not sut.head_checkbox_button.get_inconsistent()
     assert not sut.head_checkbox_button.get_active()
+    assert sut.list_store.selected_num == 0
 
 
 # expected data based on test_qapp setup
@@ -157,6 +189,14 @@ UP_SERVICE_VMS = 3
 UP_APP_VMS = 4
 
 
+def _running(*_args):
+    return True
+
+
+def _not_running(*_args):
+    return False
+
+
 @pytest.mark.parametrize(
     "restart_service_vms, restart_other_vms, excluded, expected",
     (
@@ -172,8 +212,8 @@ UP_APP_VMS = 4
 )
 def test_populate_restart_list(
         restart_service_vms, restart_other_vms, excluded, expected,
-        real_builder, test_qapp, updatable_vms_list,
-        mock_next_button, mock_cancel_button, mock_settings, mock_tree_view
+        summary_page, test_qapp, updatable_vms_list, mock_settings,
+        mock_tree_view
 ):
     mock_settings.restart_other_vms = restart_other_vms
     mock_settings.restart_service_vms = restart_service_vms
@@ -182,26 +222,35 @@ def test_populate_restart_list(
             (exclude, "admin.vm.feature.Get", 'restart-after-update', None)
         ] = b"0\x00" + "".encode()
 
-    mock_log = Mock()
-    sut = SummaryPage(
-        real_builder, mock_log, mock_next_button, mock_cancel_button,
-        back_by_row_selection=lambda *args: None  # callback
-    )
+    sut = summary_page
     sut.summary_list = mock_tree_view
 
     for row in updatable_vms_list:
         row.set_status(UpdateStatus.Success)
         if row.vm.klass == "TemplateVM":
             for i, appvm in enumerate(row.vm.appvms):
-                if i < UP_VMS:
-                    appvm.is_running = lambda *_args: True
-                else:
-                    appvm.is_running = lambda *_args: False
+                appvm.is_running = _running if i < UP_VMS else _not_running
 
     sut.populate_restart_list(True, updatable_vms_list, mock_settings)
 
     assert len(sut.list_store) == UP_VMS
     assert sum(row.selected for row in sut.list_store) == expected
+    assert sut.list_store.selected_num == expected
+
+
+def test_populate_restart_list_no_template_updated(
+        summary_page, updatable_vms_list, mock_settings, mock_tree_view
+):
+    sut = summary_page
+    sut.summary_list = mock_tree_view
+
+    sut.populate_restart_list(True, updatable_vms_list, mock_settings)
+
+    assert len(sut.list_store) == 0
+    # header checkbox still follows the settings
+    assert sut.head_checkbox.state == HeaderCheckbox.EXTENDED
+    assert sut.head_checkbox.allowed_mask == \
+           AppVMType.SERVICEVM | AppVMType.NON_SERVICEVM
 
 
 @patch('qubes_config.widgets.gtk_utils.show_dialog')
@@ -219,14 +268,10 @@ def test_populate_restart_list(
 def test_restart_selected_vms(
         mock_threading, mock_new_from_pixbuf, mock_show_dialog_qui,
         mock_show_dialog, alive_requests_max, status, mock_thread, test_qapp,
-        real_builder, mock_next_button, mock_cancel_button
+        summary_page
 ):
     # ARRANGE
-    mock_log = Mock()
-    sut = SummaryPage(
-        real_builder, mock_log, mock_next_button, mock_cancel_button,
-        back_by_row_selection=lambda *args: None  # callback
-    )
+    sut = summary_page
     mock_thread.alive_requests_max = alive_requests_max
     mock_threading.return_value = mock_thread
     icon = "icon"
@@ -297,8 +342,8 @@ def test_restart_selected_vms(
 
 @patch("qui.updater.summary_page.wait_for_domain_shutdown")
 def test_perform_restart(
-        _mock_wait_for_domain_shutdown, test_qapp,
-        real_builder, mock_next_button, mock_cancel_button, mock_list_store
+        _mock_wait_for_domain_shutdown, test_qapp, summary_page,
+        mock_list_store
 ):
     # ARRANGE
 
@@ -320,11 +365,7 @@ def test_perform_restart(
     for call_ in expected_start_calls:
         test_qapp.expected_calls[call_] = b'0\x00'
 
-    mock_log = Mock()
-    sut = SummaryPage(
-        real_builder, mock_log, mock_next_button, mock_cancel_button,
-        back_by_row_selection=lambda *args: None  # callback
-    )
+    sut = summary_page
 
     sut.updated_tmpls = ListWrapper(UpdateRowWrapper, mock_list_store)
     sut.list_store = ListWrapper(RestartRowWrapper, mock_list_store)
@@ -342,3 +383,68 @@ def test_perform_restart(
     assert all(item in test_qapp.actual_calls
                for item in expected_state_calls + expected_shutdown_calls
                + expected_start_calls)
+
+    # service qubes (e.g. netvm of other appvms) are restarted before
+    # other appvms are shut down
+    calls = test_qapp.actual_calls
+    last_start = max(i for i, call_ in enumerate(calls)
+                     if call_[1] == 'admin.vm.Start')
+    first_other_shutdown = min(
+        i for i, call_ in enumerate(calls)
+        if call_[1] == 'admin.vm.Shutdown' and call_[0] not in to_start
+        and call_[0] not in ('fedora-35', 'fedora-36'))
+    assert last_start < first_other_shutdown
+
+
+@patch("qui.updater.summary_page.wait_for_domain_shutdown")
+def test_perform_restart_errors(
+        _mock_wait_for_domain_shutdown, test_qapp, summary_page,
+        mock_list_store
+):
+    # ARRANGE
+    for tmpl in ('fedora-35', 'fedora-36'):
+        test_qapp.expected_calls[
+            (tmpl, 'admin.vm.CurrentState', None, None)] = \
+            b'0\x00power_state=Running mem=1024'
+
+    for vm in ('fedora-35', 'fedora-36', 'sys-firewall', 'sys-usb',
+               'test-blue', 'test-red', 'test-vm', 'vault'):
+        test_qapp.expected_calls[(vm, 'admin.vm.Shutdown', 'force', None)] = \
+            b'0\x00'
+    test_qapp.expected_calls[('sys-net', 'admin.vm.Shutdown', 'force', None)] \
+        = b'2\x00QubesVMError\x00\x00Shutdown failed\x00'
+
+    test_qapp.expected_calls[('sys-firewall', 'admin.vm.Start', None, None)] = \
+        b'0\x00'
+    test_qapp.expected_calls[('sys-usb', 'admin.vm.Start', None, None)] = \
+        b'2\x00QubesVMError\x00\x00Start failed\x00'
+
+    sut = summary_page
+
+    sut.updated_tmpls = ListWrapper(UpdateRowWrapper, mock_list_store)
+    sut.list_store = ListWrapper(RestartRowWrapper, mock_list_store)
+    for vm in test_qapp.domains:
+        if vm.klass in ("TemplateVM",):
+            sut.updated_tmpls.append_vm(vm)
+        if vm.klass in ("AppVM",):
+            sut.list_store.append_vm(vm)
+            sut.list_store[-1].selected = True
+
+    # ACT
+    sut.perform_restart()
+
+    # ASSERT
+    assert sut.status == RestartStatus.ERROR
+    assert "sys-net cannot shutdown: Shutdown failed" in sut.err
+    assert "sys-usb cannot start: Start failed" in sut.err
+    assert "sys-firewall" not in sut.err
+    # qube which did not shut down is not started again
+    assert ('sys-net', 'admin.vm.Start', None, None) \
+           not in test_qapp.actual_calls
+    assert ('sys-firewall', 'admin.vm.Start', None, None) \
+           in test_qapp.actual_calls
+
+    # templates are shut down before any appvm
+    shutdowns = [call_[0] for call_ in test_qapp.actual_calls
+                 if call_[1] == 'admin.vm.Shutdown']
+    assert set(shutdowns[:2]) == {'fedora-35', 'fedora-36'}
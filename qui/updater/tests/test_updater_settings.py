@@ -20,10 +20,8 @@
 # USA.
 from unittest.mock import Mock
 
-import gi
 import pytest
 
-gi.require_version('Gtk', '3.0')  # isort:skip
 from gi.repository import Gtk
 
 from qui.updater.updater_settings import Settings
@@ -17,7 +17,12 @@
 #
 # You should have received a copy of the GNU Lesser General Public License along
 # with this program; if not, see <http://www.gnu.org/licenses/>.
+from unittest.mock import Mock
+
+import pytest
+
 from qui.utils import check_support
+from qui.updater.utils import ListWrapper, RowWrapper
 from qubesadmin.tests.mock_app import MockQubes, MockQube
 
 def test_check_support():
@@ -50,3 +55,25 @@ def test_check_support():
     assert not check_support(normal_debian)
     assert check_support(nothing_special)
 
+
+@pytest.mark.parametrize(
+    # first, second: (klass, label index) of compared rows
+    # expected: result of the sort function
+    "first, second, expected",
+    (
+        pytest.param(("AppVM", 1), ("AppVM", 2), -1, id="label"),
+        pytest.param(("AppVM", 2), ("AppVM", 1), 1, id="label reversed"),
+        pytest.param(("AppVM", 1), ("AppVM", 1), 0, id="equal"),
+        pytest.param(("TemplateVM", 8), ("AppVM", 1), -1, id="klass"),
+        pytest.param(("AdminVM", 1), ("DispVM", 1), -1, id="klass first"),
+        pytest.param(("RemoteVM", 1), ("DispVM", 8), 1, id="unknown klass"),
+        pytest.param(("RemoteVM", 1), ("RemoteVM", 1), 0,
+                     id="unknown klass equal"),
+    )
+)
+def test_sort_func(first, second, expected, mock_list_store):
+    for klass, label_index in (first, second):
+        vm = Mock(klass=klass, label=Mock(index=label_index))
+        RowWrapper(mock_list_store, vm, [])
+
+    assert ListWrapper.sort_func(mock_list_store, 0, 1, 0) == expected
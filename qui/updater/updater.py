@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=wrong-import-position,import-error
 import argparse
+import functools
 import logging
 import time
 
@@ -256,7 +257,9 @@ class QubesUpdater(Gtk.Application):
             self.release()
 
 
-def parse_args(args):
+@functools.lru_cache(maxsize=1)
+def get_parser() -> argparse.ArgumentParser:
+    """Build the command line parser once and reuse it."""
     parser = argparse.ArgumentParser()
 
     parser.add_argument('--log', action='store', default='WARNING',
@@ -296,7 +299,11 @@ def parse_args(args):
     parser.add_argument('--dom0', action='store_true',
                         help='Target dom0')
 
-    args = parser.parse_args(args)
+    return parser
+
+
+def parse_args(args):
+    args = get_parser().parse_args(args)
 
     return args
 
@@ -23,11 +23,13 @@ import functools
 import gi
 
 from enum import Enum
-from typing import List
+from typing import List, Optional
 
 gi.require_version('Gtk', '3.0')  # isort:skip
 from gi.repository import Gtk
 
+from qubes_config.widgets.gtk_utils import load_icon
+
 
 def disable_checkboxes(func):
     """
@@ -115,16 +117,25 @@ def on_head_checkbox_toggled(list_store, head_checkbox, select_rows):
         head_checkbox.state = HeaderCheckbox.NONE
         selected_num = 0
     else:
-        selected_num = selected_num_old = sum(
-            row.selected for row in list_store)
+        selected_num = selected_num_old = list_store.selected_num
         while selected_num == selected_num_old:
             head_checkbox.next_state()
             select_rows()
-            selected_num = sum(
-                row.selected for row in list_store)
+            selected_num = list_store.selected_num
     head_checkbox.set_buttons(selected_num)
 
 
+@functools.lru_cache(maxsize=64)
+def load_qube_icon(icon_name: str):
+    """
+    Load icon of a qube.
+
+    Many qubes share the same icon, so the pixbuf is loaded once per icon name
+    and shared between rows.
+    """
+    return load_icon(icon_name)
+
+
 class QubeClass(Enum):
     """
     Sorting order by vm type.
@@ -205,25 +216,54 @@ class UpdateStatus(Enum):
 
 
 class RowWrapper:
+    # column of the selection checkbox, the first one holds the wrapper itself
+    _SELECTION = 1
+
     def __init__(self, list_store, vm, raw_row: list):
         super().__init__()
         self.list_store = list_store
         self.vm = vm
+        self.list_wrapper: Optional["ListWrapper"] = None
+        self._sort_key: Optional[tuple] = None
 
         self.list_store.append([self, *raw_row])
         self.raw_row = self.list_store[-1]
 
+    @property
+    def sort_key(self) -> tuple:
+        """
+        Rows are ordered by qube class and then by label.
+
+        Classes missing from `QubeClass` are placed after all known ones.
+        """
+        if self._sort_key is None:
+            try:
+                class_order = QubeClass[self.vm.klass].value
+            except KeyError:
+                class_order = len(QubeClass)
+            self._sort_key = (
+                class_order, self.vm.klass, self.vm.label.index)
+        return self._sort_key
+
     def __eq__(self, other):
-        if self.vm.klass == other.vm.klass:
-            return self.vm.label.index == other.vm.label.index
-        return False
+        return self.sort_key == other.sort_key
 
     def __lt__(self, other):
-        self_class = QubeClass[self.vm.klass]
-        other_class = QubeClass[other.vm.klass]
-        if self_class == other_class:
-            return self.vm.label.index == other.vm.label.index
-        return self_class.value < other_class.value
+        return self.sort_key < other.sort_key
+
+    def _set_selection(self, value) -> bool:
+        """
+        Store selection of the row and keep count of selected rows.
+
+        Returns False if the row already had this selection.
+        """
+        value = bool(value)
+        if self.raw_row[self._SELECTION] == value:
+            return False
+        self.raw_row[self._SELECTION] = value
+        if self.list_wrapper is not None:
+            self.list_wrapper.selected_num += 1 if value else -1
+        return True
 
     @property
     def selected(self):
@@ -263,6 +303,7 @@ class ListWrapper:
         self.list_store_raw = list_store_raw
         self.list_store_wrapped: list = []
         self.row_type = row_type
+        self.selected_num = 0
         for idx in range(self.row_type.COLUMN_NUM):
             self.list_store_raw.set_sort_func(idx, self.sort_func, idx)
 
@@ -277,8 +318,26 @@ class ListWrapper:
 
     def append_vm(self, vm, state: bool = False):
         qube_row = self.row_type(self.list_store_raw, vm, state)
+        qube_row.list_wrapper = self
+        self.selected_num += bool(qube_row.selected)
         self.list_store_wrapped.append(qube_row)
 
+    def extend_vms(self, vms):
+        """
+        Append all `vms` to the list.
+
+        Sorting of the model is suspended while rows are added, so the model
+        is sorted once at the end instead of after every row.
+        """
+        sort_column, sort_order = self.list_store_raw.get_sort_column_id()
+        if sort_column is not None:
+            self.list_store_raw.set_sort_column_id(
+                Gtk.TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID, sort_order)
+        for vm in vms:
+            self.append_vm(vm)
+        if sort_column is not None:
+            self.list_store_raw.set_sort_column_id(sort_column, sort_order)
+
     def invert_selection(self, path):
         it = self.list_store_raw.get_iter(path)
         self.list_store_raw[it][0].selected = \
@@ -295,7 +354,8 @@ class ListWrapper:
             result.append_vm(row.vm)
         return result
 
-    def sort_func(self, model, iter1, iter2, data):
+    @staticmethod
+    def sort_func(model, iter1, iter2, data):
         # Get the values at the two iter indices
         value1 = model[iter1][data]
         value2 = model[iter2][data]